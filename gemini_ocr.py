@@ -1,33 +1,200 @@
 import os
-import glob
+import re
 import base64
 import time
 import random
+import asyncio
+import sqlite3
+import hashlib
 import datetime
+import threading
+import statistics
+import collections
+import concurrent.futures
 from pathlib import Path
-from concurrent.futures import ThreadPoolExecutor
 import google.generativeai as genai
-from tqdm import tqdm
+from google.api_core import exceptions as google_exceptions
+from googleapiclient import errors as googleapiclient_errors
+from tqdm.asyncio import tqdm
+
+# Prefijo de los resultados rechazados porque se agotó la cuota diaria
+QUOTA_EXHAUSTED_MESSAGE = "Cuota diaria agotada"
+
+def _natural_sort_key(path):
+    """
+    Clave de ordenación que compara los números de una ruta como enteros,
+    de modo que page_9.png va antes que page_10.png.
+    """
+    # re.split con un grupo deja los números en las posiciones impares; isdigit() no sirve
+    # porque acepta caracteres como '²' que int() no puede convertir
+    return [int(part) if index % 2 else part for index, part in enumerate(re.split(r"(\d+)", path))]
+
+def _find_pending_images(root, recursive=False):
+    """
+    Busca imágenes PNG recorriendo los directorios una sola vez con os.scandir y
+    descarta las que ya tienen un resultado (.md o .txt con el mismo nombre) al lado.
+    
+    Args:
+        root (str): Carpeta en la que buscar
+        recursive (bool): Si se deben buscar imágenes en subcarpetas
+        
+    Returns:
+        tuple: (lista de rutas pendientes, número de imágenes ya procesadas)
+    """
+    pending = []
+    skipped = 0
+    directories = [root]
+    while directories:
+        directory = directories.pop()
+        images = []
+        names = set()
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    if recursive:
+                        directories.append(entry.path)
+                    continue
+                # Se compara en minúsculas para aceptar también *.PNG, *.MD, etc.
+                names.add(entry.name.lower())
+                if entry.name.lower().endswith(".png"):
+                    images.append(entry)
+        
+        for entry in images:
+            stem = entry.name[:-len(".png")].lower()
+            if f"{stem}.md" in names or f"{stem}.txt" in names:
+                skipped += 1
+            else:
+                pending.append(entry.path)
+    return pending, skipped
+
+def _split_pages(text, expected_pages):
+    """
+    Divide una respuesta con varias páginas delimitadas por líneas '## PAGE n'.
+    
+    Args:
+        text (str): Respuesta de la API
+        expected_pages (int): Número de páginas esperadas
+        
+    Returns:
+        list: Texto de cada página en orden, o None si los marcadores no son exactamente 1..n
+              o hay texto antes del primero
+    """
+    parts = re.split(r"^\s*#+\s*PAGE\s+(\d+)\s*$", text, flags=re.MULTILINE)
+    # Debe haber exactamente un marcador por página, numerados de 1 a n en orden, y
+    # ningún texto antes del primero; si no, alguna sección se perdería
+    if parts[0].strip() or [int(number) for number in parts[1::2]] != list(range(1, expected_pages + 1)):
+        return None
+    return [content.strip() for content in parts[2::2]]
 
 class RateLimiter:
     """
     Clase para controlar la velocidad de las solicitudes a la API.
     Implementa límites basados en:
     - RPD (Requests per Day): 25
+    
+    Usa una ventana deslizante sobre un deque de timestamps monotónicos: el más
+    antiguo siempre está en la cabeza, por lo que cada comprobación es O(1) amortizado.
+    
+    En modo no interactivo actúa como circuit breaker: si la espera necesaria supera
+    circuit_break_seconds, no espera y rechaza las solicitudes hasta que la ventana
+    tenga hueco de nuevo. Lo mismo ocurre si el usuario cancela la espera en modo
+    interactivo.
     """
     
-    def __init__(self, max_requests_per_day=25):
+    WINDOW_SECONDS = 86400.0  # 24 horas
+    
+    def __init__(self, max_requests_per_day=25, circuit_break_seconds=300):
         self.max_requests_per_day = max_requests_per_day
-        self.request_timestamps = []
-        self.lock = __import__('threading').Lock()
+        self.circuit_break_seconds = circuit_break_seconds
+        self.request_timestamps = collections.deque()
+        self.lock = threading.Lock()
+        self.tripped = False
+        self.cancelled = False  # el usuario canceló: no se admiten más hasta que la ventana tenga hueco
+        self.waiting = False  # el usuario ya aceptó esperar a que la ventana tenga hueco
+    
+    def _clean_old_timestamps(self, now):
+        """Elimina timestamps más antiguos que 24 horas (requiere tener self.lock)"""
+        one_day_ago = now - self.WINDOW_SECONDS
+        while self.request_timestamps and self.request_timestamps[0] <= one_day_ago:
+            self.request_timestamps.popleft()
     
-    def _clean_old_timestamps(self):
-        """Elimina timestamps más antiguos que 24 horas"""
-        now = datetime.datetime.now()
-        one_day_ago = now - datetime.timedelta(days=1)
+    def reserve(self):
+        """
+        Registra una solicitud si la ventana diaria tiene hueco, sin bloquear.
+        
+        Returns:
+            float: 0 si la solicitud se registró, o segundos que faltan hasta que haya hueco
+        """
         with self.lock:
-            self.request_timestamps = [ts for ts in self.request_timestamps 
-                                     if ts > one_day_ago]
+            now = time.monotonic()
+            self._clean_old_timestamps(now)
+            
+            # Si no hemos alcanzado el límite diario, no es necesario esperar
+            if len(self.request_timestamps) < self.max_requests_per_day:
+                self.tripped = False
+                self.cancelled = False
+                self.waiting = False
+                self.request_timestamps.append(now)
+                return 0
+            
+            # Necesitamos esperar hasta que el timestamp más antiguo tenga más de 24 horas
+            return self.request_timestamps[0] + self.WINDOW_SECONDS - now
+    
+    def should_wait(self, wait_seconds, interactive=False):
+        """
+        Decide si se debe esperar a que haya hueco en la ventana diaria. Muestra el aviso
+        de límite alcanzado y, en modo interactivo, pregunta al usuario (bloquea en input()).
+        
+        Args:
+            wait_seconds (float): Segundos que faltan hasta que haya hueco
+            interactive (bool): Si es True, pregunta al usuario si desea continuar esperando
+                               o cancelar el proceso cuando se alcanza el límite.
+        
+        Returns:
+            bool: True si se debe esperar, False si se debe cancelar.
+                  Si se cancela porque la cuota está agotada, self.tripped es True;
+                  si lo cancela el usuario, self.cancelled es True.
+        """
+        # Con el circuito abierto o tras cancelar se rechaza directamente, sin volver a avisar
+        if self.tripped or self.cancelled:
+            return False
+        # Si ya se aceptó esperar, las demás solicitudes esperan sin volver a preguntar
+        if self.waiting:
+            return True
+        
+        available_at = datetime.datetime.now() + datetime.timedelta(seconds=wait_seconds)
+        
+        # Convertir segundos a un formato más legible
+        hours, remainder = divmod(wait_seconds, 3600)
+        minutes, seconds = divmod(remainder, 60)
+        wait_time_str = f"{int(hours)} horas, {int(minutes)} minutos y {int(seconds)} segundos"
+        
+        print("\n" + "="*80)
+        print(f"⚠️  LÍMITE DIARIO ALCANZADO: Has llegado al límite de {self.max_requests_per_day} solicitudes por día.")
+        print(f"⏱️  Tiempo de espera necesario: {wait_time_str}")
+        print(f"📅  Podrás realizar más solicitudes a partir de: {available_at.strftime('%Y-%m-%d %H:%M:%S')}")
+        print("="*80 + "\n")
+        
+        if not interactive and wait_seconds > self.circuit_break_seconds:
+            print("Cuota diaria agotada: se detiene el procesamiento. Vuelve a ejecutarlo más tarde.")
+            self.tripped = True
+            return False
+        
+        if interactive:
+            try:
+                response = input("¿Deseas esperar y continuar automáticamente? (s/n): ").strip().lower()
+                if response != 's' and response != 'si' and response != 'sí':
+                    print("Proceso cancelado por el usuario.")
+                    self.cancelled = True
+                    return False
+            except (KeyboardInterrupt, EOFError):
+                print("\nProceso cancelado por el usuario.")
+                self.cancelled = True
+                return False
+        
+        print(f"Esperando {wait_time_str} para respetar los límites de la API...")
+        self.waiting = True
+        return True
     
     def wait_if_needed(self, interactive=False):
         """
@@ -38,103 +205,437 @@ class RateLimiter:
                                o cancelar el proceso cuando se alcanza el límite.
         
         Returns:
-            tuple: (tiempo de espera en segundos, True si debe continuar, False si debe cancelar)
+            tuple: (tiempo de espera en segundos, True si debe continuar, False si debe cancelar).
+                   Si se cancela porque la cuota está agotada, self.tripped es True.
+        """
+        waited = 0
+        while True:
+            wait_seconds = self.reserve()
+            if wait_seconds == 0:
+                return waited, True
+            if not self.should_wait(wait_seconds, interactive):
+                return wait_seconds, False
+            time.sleep(wait_seconds)
+            waited += wait_seconds
+
+class AdaptiveConcurrencyLimiter:
+    """
+    Limita el número de solicitudes simultáneas con un controlador AIMD
+    (incremento aditivo, decremento multiplicativo):
+    - Éxito con latencia <= objetivo: c = min(c_max, c + alpha)
+    - 429/5xx/timeout: c = max(c_min, c * beta)
+    
+    El objetivo de latencia es la mediana de las últimas latencias observadas
+    multiplicada por latency_factor.
+    """
+    
+    def __init__(self, initial=2, min_concurrency=1, max_concurrency=8,
+                 alpha=0.5, beta=0.5, window=20, latency_factor=1.5):
+        self.limit = float(max(min_concurrency, min(initial, max_concurrency)))
+        self.min_concurrency = min_concurrency
+        self.max_concurrency = max_concurrency
+        self.alpha = alpha
+        self.beta = beta
+        self.latency_factor = latency_factor
+        self.latencies = collections.deque(maxlen=window)
+        self.in_flight = 0
+        self.paused_until = 0.0
+        self.condition = asyncio.Condition()
+    
+    async def acquire(self):
+        """
+        Espera a que haya un hueco disponible según la concurrencia actual.
+        
+        Returns:
+            float: Instante (time.monotonic) en que se concedió el hueco
         """
-        self._clean_old_timestamps()
+        # Respetar la pausa indicada por el servidor tras un 429 antes de ocupar un hueco,
+        # para no retenerlo si la tarea se cancela durante la espera
+        delay = self.paused_until - time.monotonic()
+        while delay > 0:
+            await asyncio.sleep(delay)
+            delay = self.paused_until - time.monotonic()
         
+        async with self.condition:
+            await self.condition.wait_for(lambda: self.in_flight < int(self.limit))
+            self.in_flight += 1
+        return time.monotonic()
+    
+    async def release(self, started=None, overloaded=False):
+        """
+        Libera un hueco y ajusta la concurrencia según el resultado de la solicitud.
+        
+        Args:
+            started (float): Valor devuelto por acquire si la solicitud tuvo éxito
+            overloaded (bool): True si la API respondió con 429, 5xx o timeout
+        """
+        async with self.condition:
+            self.in_flight -= 1
+            if overloaded:
+                self.limit = max(self.min_concurrency, self.limit * self.beta)
+            elif started is not None:
+                latency = time.monotonic() - started
+                self.latencies.append(latency)
+                target = statistics.median(self.latencies) * self.latency_factor
+                if latency <= target:
+                    self.limit = min(self.max_concurrency, self.limit + self.alpha)
+            self.condition.notify_all()
+    
+    def pause(self, seconds):
+        """Retrasa las nuevas solicitudes el tiempo indicado por el servidor."""
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+class ResultCache:
+    """
+    Caché persistente de resultados OCR en SQLite.
+    Las claves combinan el hash del contenido del archivo con el prompt, el idioma
+    y el modelo, de modo que repetir un archivo ya procesado no consume cuota de la API.
+    """
+    
+    DEFAULT_PATH = Path.home() / ".cache" / "gemini_ocr" / "results.sqlite3"
+    
+    def __init__(self, path=None):
+        path = Path(path) if path else self.DEFAULT_PATH
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.lock = threading.Lock()
+        # timeout permite que varios procesos compartan la caché sin errores de bloqueo
+        self.connection = sqlite3.connect(str(path), timeout=30, check_same_thread=False)
+        with self.lock, self.connection:
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, text TEXT NOT NULL)"
+            )
+    
+    def get(self, key):
+        """Devuelve el texto almacenado para la clave o None si no existe."""
         with self.lock:
-            # Si no hemos alcanzado el límite diario, no es necesario esperar
-            if len(self.request_timestamps) < self.max_requests_per_day:
-                self.request_timestamps.append(datetime.datetime.now())
-                return 0, True
-            
-            # Calcular cuánto tiempo debemos esperar
-            oldest_timestamp = min(self.request_timestamps)
-            now = datetime.datetime.now()
-            one_day_from_oldest = oldest_timestamp + datetime.timedelta(days=1)
-            
-            if now < one_day_from_oldest:
-                # Necesitamos esperar hasta que el timestamp más antiguo tenga más de 24 horas
-                wait_seconds = (one_day_from_oldest - now).total_seconds()
-                
-                # Convertir segundos a un formato más legible
-                hours, remainder = divmod(wait_seconds, 3600)
-                minutes, seconds = divmod(remainder, 60)
-                wait_time_str = f"{int(hours)} horas, {int(minutes)} minutos y {int(seconds)} segundos"
-                
-                print("\n" + "="*80)
-                print(f"⚠️  LÍMITE DIARIO ALCANZADO: Has llegado al límite de {self.max_requests_per_day} solicitudes por día.")
-                print(f"⏱️  Tiempo de espera necesario: {wait_time_str}")
-                print(f"📅  Podrás realizar más solicitudes a partir de: {one_day_from_oldest.strftime('%Y-%m-%d %H:%M:%S')}")
-                print("="*80 + "\n")
-                
-                if interactive:
-                    try:
-                        response = input("¿Deseas esperar y continuar automáticamente? (s/n): ").strip().lower()
-                        if response != 's' and response != 'si' and response != 'sí':
-                            print("Proceso cancelado por el usuario.")
-                            return wait_seconds, False
-                    except KeyboardInterrupt:
-                        print("\nProceso cancelado por el usuario.")
-                        return wait_seconds, False
-                
-                print(f"Esperando {wait_time_str} para respetar los límites de la API...")
-                time.sleep(wait_seconds)
-                
-                # Después de esperar, actualizamos y añadimos el nuevo timestamp
-                self._clean_old_timestamps()
-                self.request_timestamps.append(datetime.datetime.now())
-                return wait_seconds, True
-            else:
-                # Ya ha pasado más de 24 horas desde la solicitud más antigua
-                self.request_timestamps.pop(0)  # Eliminar el más antiguo
-                self.request_timestamps.append(datetime.datetime.now())
-                return 0, True
+            row = self.connection.execute(
+                "SELECT text FROM results WHERE key = ?", (key,)
+            ).fetchone()
+        return row[0] if row else None
+    
+    def set(self, key, text):
+        """Guarda el texto extraído para la clave."""
+        with self.lock, self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO results (key, text) VALUES (?, ?)", (key, text)
+            )
+    
+    def close(self):
+        """Cierra la conexión con la base de datos."""
+        with self.lock:
+            self.connection.close()
 
 class GeminiOCRProcessor:
     """
     Procesador OCR que utiliza Google Gemini 2.5 Pro para extraer texto de imágenes y PDFs.
     """
     
-    def __init__(self, api_key, max_workers=2, max_retries=5, max_requests_per_day=25, interactive=False):
+    # Errores temporales de la API (5xx y tiempo de espera agotado) que se reintentan
+    TRANSIENT_ERRORS = (
+        google_exceptions.InternalServerError,
+        google_exceptions.ServiceUnavailable,
+        google_exceptions.DeadlineExceeded,
+    )
+    
+    # Errores que indican que la API está saturada y se debe reducir la concurrencia
+    OVERLOAD_ERRORS = (google_exceptions.ResourceExhausted,) + TRANSIENT_ERRORS
+    
+    MODEL_NAME = 'gemini-1.5-pro'
+    
+    def __init__(self, api_key, max_workers=2, max_retries=5, max_requests_per_day=25, interactive=False,
+                 max_concurrency=8, use_cache=True, cache_path=None,
+                 circuit_break_seconds=300, request_timeout=600):
         """
         Inicializa el procesador OCR con la API de Google Gemini.
         
         Args:
             api_key (str): API key de Google Gemini
-            max_workers (int): Número máximo de trabajadores para procesamiento paralelo
-            max_retries (int): Número máximo de reintentos para errores de cuota
+            max_workers (int): Número inicial de solicitudes simultáneas en procesamiento por lotes
+            max_retries (int): Número máximo de reintentos para errores de cuota y errores
+                               temporales de la API
             max_requests_per_day (int): Número máximo de solicitudes por día
             interactive (bool): Si es True, pregunta al usuario si desea continuar esperando
                                o cancelar el proceso cuando se alcanza el límite.
+            max_concurrency (int): Máximo de solicitudes simultáneas al que puede crecer
+                                   el control adaptativo de concurrencia
+            use_cache (bool): Si es True, reutiliza resultados de archivos ya procesados
+            cache_path (str): Ruta del archivo de caché (por defecto ~/.cache/gemini_ocr/)
+            circuit_break_seconds (float): En modo no interactivo, espera máxima por el límite
+                                           diario antes de abandonar las solicitudes restantes
+            request_timeout (float): Tiempo máximo en segundos de cada solicitud a la API;
+                                     si se agota, la solicitud se reintenta
         """
         self.api_key = api_key
         self.max_workers = max_workers
+        self.max_concurrency = max_concurrency
         self.max_retries = max_retries
         self.interactive = interactive
+        self.request_timeout = request_timeout
         genai.configure(api_key=self.api_key)
         
         # Configurar el modelo Gemini 2.5 Pro
-        self.model = genai.GenerativeModel('gemini-1.5-pro')
+        self.model = genai.GenerativeModel(self.MODEL_NAME)
         
         # Inicializar el rate limiter
-        self.rate_limiter = RateLimiter(max_requests_per_day=max_requests_per_day)
+        self.rate_limiter = RateLimiter(
+            max_requests_per_day=max_requests_per_day,
+            circuit_break_seconds=circuit_break_seconds
+        )
+        
+        # Inicializar la caché de resultados
+        self.cache = ResultCache(cache_path) if use_cache else None
+        
+        # Subidas a la Files API en uso, indexadas por hash del contenido; se borran
+        # del servidor en cuanto ninguna tarea las necesita
+        self.uploaded_files = {}
+        
+        # Resultados en curso, indexados por clave de caché, para no enviar dos veces el
+        # mismo contenido a la vez; cada futuro se resuelve con el texto o None si falló
+        self.in_flight_results = {}
+        
+        # Serializa la decisión al alcanzar el límite diario (se crea en el bucle)
+        self.quota_lock = None
+        
+        # Hashes ya calculados, indexados por (ruta, tamaño, fecha de modificación)
+        self.file_hashes = {}
+        
+        # Bucle de eventos propio en un hilo dedicado: el cliente asíncrono de genai queda
+        # ligado al bucle en el que se crea, así que todas las llamadas se envían a este.
+        # Los métodos síncronos se pueden llamar desde varios hilos a la vez y desde código
+        # que ya tiene un bucle en marcha (por ejemplo, Jupyter)
+        self.loop = asyncio.new_event_loop()
+        self.loop_thread = threading.Thread(
+            target=self.loop.run_forever, name="gemini-ocr-loop", daemon=True
+        )
+        self.loop_thread.start()
+    
+    def _run(self, coroutine):
+        """
+        Ejecuta una corrutina en el bucle de eventos del procesador y espera su resultado.
+        
+        Args:
+            coroutine: Corrutina a ejecutar
+            
+        Returns:
+            Resultado de la corrutina
+        """
+        future = asyncio.run_coroutine_threadsafe(coroutine, self.loop)
+        try:
+            # Esperar a intervalos para que Ctrl-C se atienda también en Windows
+            while True:
+                try:
+                    return future.result(timeout=0.5)
+                except concurrent.futures.TimeoutError:
+                    continue
+        except KeyboardInterrupt:
+            future.cancel()
+            raise
     
-    def _encode_file(self, file_path):
+    def close(self):
         """
-        Codifica un archivo para enviarlo a la API.
+        Detiene el bucle de eventos del procesador y cierra la caché.
+        El procesador no se puede usar después de cerrarlo.
+        """
+        if self.loop.is_closed():
+            return
+        # Cancelar las tareas que queden (por ejemplo, tras Ctrl-C) para que liberen sus
+        # subidas antes de detener el bucle
+        asyncio.run_coroutine_threadsafe(self._cancel_pending_tasks(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.loop_thread.join()
+        self.loop.close()
+        if self.cache is not None:
+            self.cache.close()
+    
+    async def _cancel_pending_tasks(self):
+        """Cancela las tareas pendientes del bucle y espera a que terminen."""
+        tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+    
+    def _hash_file(self, file_path, chunk_size=1024 * 1024):
+        """
+        Calcula el hash SHA-256 de un archivo leyéndolo por bloques. El resultado se
+        recuerda mientras el archivo no cambie de tamaño ni de fecha de modificación.
         
         Args:
             file_path (str): Ruta al archivo (imagen o PDF)
+            chunk_size (int): Tamaño de cada bloque de lectura en bytes
             
         Returns:
-            dict: Objeto para la API de Gemini
+            str: Hash SHA-256 del contenido en hexadecimal
+        """
+        stat = os.stat(file_path)
+        memo_key = (file_path, stat.st_size, stat.st_mtime_ns)
+        file_hash = self.file_hashes.get(memo_key)
+        if file_hash is None:
+            digest = hashlib.sha256()
+            with open(file_path, "rb") as file:
+                for chunk in iter(lambda: file.read(chunk_size), b""):
+                    digest.update(chunk)
+            file_hash = digest.hexdigest()
+            self.file_hashes[memo_key] = file_hash
+        return file_hash
+    
+    def _upload_file(self, file_path):
+        """
+        Sube un archivo con la Files API de Gemini, que lo envía por partes desde disco
+        en lugar de cargarlo entero en memoria.
+        
+        Args:
+            file_path (str): Ruta al archivo (imagen o PDF)
+            
+        Returns:
+            File: Referencia al archivo subido para la API de Gemini
         """
         file_extension = os.path.splitext(file_path)[1].lower()
         mime_type = "application/pdf" if file_extension == ".pdf" else "image/png"
+        try:
+            return genai.upload_file(path=file_path, mime_type=mime_type)
+        except googleapiclient_errors.HttpError as e:
+            # La Files API usa googleapiclient: se traduce al error equivalente de
+            # google.api_core para reintentarlo igual que los de la generación
+            raise google_exceptions.from_http_status(e.resp.status, str(e)) from e
+    
+    def _delete_file(self, uploaded):
+        """
+        Borra un archivo subido con la Files API. Un fallo solo se avisa: el archivo
+        caduca por sí solo en el servidor.
         
-        with open(file_path, "rb") as file:
-            return {"mime_type": mime_type, "data": file.read()}
+        Args:
+            uploaded (File): Referencia al archivo subido
+        """
+        try:
+            genai.delete_file(uploaded.name)
+        except Exception as e:
+            print(f"No se pudo borrar el archivo subido {uploaded.name}: {str(e)}")
+    
+    def _retain_upload(self, file_hash):
+        """
+        Registra que una tarea va a usar la subida de un contenido. Las tareas que procesan
+        el mismo contenido (y los reintentos) comparten una única subida.
+        
+        Args:
+            file_hash (str): Hash SHA-256 del contenido del archivo
+        """
+        entry = self.uploaded_files.setdefault(file_hash, {"users": 0, "upload": None})
+        entry["users"] += 1
+    
+    async def _get_upload(self, file_path, file_hash):
+        """
+        Sube el archivo, o reutiliza la subida previa del mismo contenido si la hay.
+        Requiere haber llamado antes a _retain_upload.
+        
+        Args:
+            file_path (str): Ruta al archivo (imagen o PDF)
+            file_hash (str): Hash SHA-256 del contenido del archivo
+            
+        Returns:
+            File: Referencia al archivo subido para la API de Gemini
+        """
+        entry = self.uploaded_files[file_hash]
+        upload = entry["upload"]
+        if upload is None or (upload.done() and (upload.cancelled() or upload.exception() is not None)):
+            upload = asyncio.ensure_future(asyncio.to_thread(self._upload_file, file_path))
+            entry["upload"] = upload
+        # shield: cancelar una tarea no debe cancelar la subida que comparte con otras
+        return await asyncio.shield(upload)
+    
+    async def _release_upload(self, file_hash):
+        """
+        Indica que una tarea ya no necesita la subida de un contenido. Cuando ninguna la
+        usa, se quita de self.uploaded_files y se borra el archivo del servidor.
+        
+        Args:
+            file_hash (str): Hash SHA-256 del contenido del archivo
+        """
+        entry = self.uploaded_files[file_hash]
+        entry["users"] -= 1
+        if entry["users"] > 0:
+            return
+        del self.uploaded_files[file_hash]
+        
+        upload = entry["upload"]
+        if upload is None:
+            return
+        try:
+            uploaded = await upload
+        except Exception:
+            return  # La subida falló: no hay nada que borrar
+        await asyncio.to_thread(self._delete_file, uploaded)
+    
+    def _cache_key(self, file_hash, custom_prompt, language):
+        """
+        Construye la clave de caché para un archivo y una configuración de extracción.
+        
+        Args:
+            file_hash (str): Hash SHA-256 del contenido del archivo
+            custom_prompt (str): Prompt personalizado para la extracción
+            language (str): Idioma del texto a extraer
+            
+        Returns:
+            str: Clave de caché
+        """
+        settings = f"{custom_prompt}{language}{self.MODEL_NAME}".encode("utf-8")
+        return f"{file_hash}:{hashlib.sha256(settings).hexdigest()}"
+    
+    async def _generate(self, contents):
+        """
+        Realiza una solicitud a la API.
+        
+        Args:
+            contents (list): Partes de la solicitud (prompt y archivo)
+            
+        Returns:
+            str: Texto de la respuesta
+        """
+        response = await self.model.generate_content_async(
+            contents=contents,
+            request_options={"timeout": self.request_timeout}
+        )
+        return response.text
+    
+    async def _send(self, request, limiter=None):
+        """
+        Envía una solicitud ocupando un hueco del limitador de concurrencia durante la
+        subida, la comprobación del límite diario y la generación. El hueco se libera
+        siempre, también al cancelar.
+        
+        Args:
+            request (callable): Función asíncrona que recibe una función generate(contents)
+                                y realiza la solicitud. generate reserva la cuota diaria justo
+                                antes de llamar a la API (después de subir los archivos, para
+                                que una subida fallida no la consuma) y devuelve None si el
+                                límite diario impide enviarla.
+            limiter (AdaptiveConcurrencyLimiter): Limitador de concurrencia opcional
+            
+        Returns:
+            str: Resultado de la solicitud, o None si el límite diario impide enviarla
+        """
+        if limiter is not None:
+            await limiter.acquire()
+        started = None
+        succeeded = False
+        overloaded = False
+        
+        async def generate(contents):
+            nonlocal started
+            if not await self._wait_for_quota():
+                return None
+            started = time.monotonic()
+            return await self._generate(contents)
+        
+        try:
+            result = await request(generate)
+            succeeded = result is not None
+            return result
+        except self.OVERLOAD_ERRORS:
+            overloaded = True
+            raise
+        finally:
+            if limiter is not None:
+                await limiter.release(started if succeeded else None, overloaded)
     
     def process_pdf_direct(self, pdf_path, custom_prompt, language="Spanish"):
         """
@@ -148,64 +649,84 @@ class GeminiOCRProcessor:
         Returns:
             str: Texto extraído del PDF
         """
-        retry_count = 0
-        base_wait_time = 2  # Tiempo base de espera en segundos
+        return self._run(self._process_pdf_direct_async(pdf_path, custom_prompt, language))
+    
+    async def _process_pdf_direct_async(self, pdf_path, custom_prompt, language="Spanish", limiter=None):
+        """
+        Versión asíncrona de process_pdf_direct.
         
-        while retry_count <= self.max_retries:
-            try:
-                # Esperar si es necesario para respetar los límites de la API
-                wait_time, should_continue = self.rate_limiter.wait_if_needed(self.interactive)
-                if not should_continue:
-                    return f"Proceso cancelado por el usuario para {pdf_path}"
-                
-                # Preparar el PDF
-                pdf_data = self._encode_file(pdf_path)
-                
-                # Crear el prompt completo
-                full_prompt = f"{custom_prompt} El texto está en {language}."
-                
-                print(f"Procesando PDF completo: {os.path.basename(pdf_path)}")
-                
-                # Realizar la solicitud a la API
-                response = self.model.generate_content(
-                    contents=[
-                        full_prompt,
-                        pdf_data
-                    ]
-                )
-                
-                # Extraer el texto de la respuesta
-                extracted_text = response.text
-                return extracted_text
+        Args:
+            pdf_path (str): Ruta al archivo PDF
+            custom_prompt (str): Prompt personalizado para la extracción
+            language (str): Idioma del texto a extraer
+            limiter (AdaptiveConcurrencyLimiter): Limitador de concurrencia opcional
+            
+        Returns:
+            str: Texto extraído del PDF
+        """
+        print(f"Procesando PDF completo: {os.path.basename(pdf_path)}")
+        return await self._process_file_async(pdf_path, custom_prompt, language, "PDF", limiter)
+    
+    def process_pdfs_direct(self, pdf_paths, custom_prompt, language="Spanish", on_result=None):
+        """
+        Procesa varios PDFs completos de forma concurrente, ajustando las solicitudes
+        en vuelo con el mismo control adaptativo que process_batch.
+        
+        Args:
+            pdf_paths (list): Rutas de los archivos PDF
+            custom_prompt (str): Prompt personalizado para la extracción
+            language (str): Idioma del texto a extraer
+            on_result (callable): Función opcional llamada con (pdf_path, resultado) en cuanto
+                                  termina cada PDF, por ejemplo para guardarlo en disco
+            
+        Returns:
+            dict: Texto extraído (o mensaje de error/cancelación) por PDF
+        """
+        return self._run(self._process_pdfs_direct_async(pdf_paths, custom_prompt, language, on_result))
+    
+    async def _process_pdfs_direct_async(self, pdf_paths, custom_prompt, language, on_result=None):
+        """
+        Versión asíncrona de process_pdfs_direct.
+        
+        Args:
+            pdf_paths (list): Rutas de los archivos PDF
+            custom_prompt (str): Prompt personalizado para la extracción
+            language (str): Idioma del texto a extraer
+            on_result (callable): Función opcional llamada con (pdf_path, resultado)
             
+        Returns:
+            dict: Texto extraído (o mensaje de error/cancelación) por PDF
+        """
+        results = {}
+        limiter = AdaptiveConcurrencyLimiter(
+            initial=self.max_workers,
+            max_concurrency=self.max_concurrency
+        )
+        
+        async def bound(pdf_path):
+            try:
+                result = await self._process_pdf_direct_async(pdf_path, custom_prompt, language, limiter)
             except Exception as e:
-                error_message = str(e)
-                
-                # Si es un error de cuota (429), implementar reintento con espera
-                if "429" in error_message and retry_count < self.max_retries:
-                    retry_count += 1
-                    
-                    # Extraer el tiempo de espera recomendado si está disponible
-                    wait_time = None
-                    if "retry_delay" in error_message and "seconds:" in error_message:
-                        try:
-                            wait_time_str = error_message.split("seconds:")[1].split("}")[0].strip()
-                            wait_time = int(wait_time_str)
-                        except:
-                            pass
-                    
-                    # Si no se pudo extraer el tiempo de espera, usar espera exponencial
-                    if not wait_time:
-                        wait_time = base_wait_time * (2 ** retry_count) + random.uniform(0, 1)
-                    
-                    print(f"Error de cuota en {pdf_path}. Reintentando en {wait_time:.1f} segundos (intento {retry_count}/{self.max_retries})...")
-                    time.sleep(wait_time)
-                else:
-                    # Si es otro tipo de error o se agotaron los reintentos, propagar el error
-                    print(f"Error procesando {pdf_path}: {error_message}")
-                    return f"Error procesando PDF: {error_message}"
+                print(f"Error procesando {pdf_path}: {str(e)}")
+                result = f"Error procesando PDF: {str(e)}"
+            return pdf_path, result
         
-        return f"Error: Se agotaron los reintentos para procesar {pdf_path}"
+        tasks = [asyncio.create_task(bound(pdf_path)) for pdf_path in pdf_paths]
+        interrupted = False
+        
+        for next_done in asyncio.as_completed(tasks):
+            pdf_path, result = await next_done
+            results[pdf_path] = result
+            if on_result is not None:
+                on_result(pdf_path, result)
+            
+            # Si el usuario canceló, el rate limiter ya no admite nuevos PDFs: los que estaban
+            # en curso terminan (y se guardan) y el resto se rechaza al instante
+            if result.startswith("Proceso cancelado por el usuario") and not interrupted:
+                print("\nProcesamiento interrumpido por el usuario; se terminan los PDFs en curso.")
+                interrupted = True
+        
+        return results
     
     def process_image(self, image_path, custom_prompt, language="Spanish"):
         """
@@ -219,65 +740,302 @@ class GeminiOCRProcessor:
         Returns:
             str: Texto extraído de la imagen
         """
+        return self._run(self._process_image_async(image_path, custom_prompt, language))
+    
+    async def _process_image_async(self, image_path, custom_prompt, language="Spanish", limiter=None):
+        """
+        Versión asíncrona de process_image.
+        
+        Args:
+            image_path (str): Ruta a la imagen
+            custom_prompt (str): Prompt personalizado para la extracción
+            language (str): Idioma del texto a extraer
+            limiter (AdaptiveConcurrencyLimiter): Limitador de concurrencia opcional
+            
+        Returns:
+            str: Texto extraído de la imagen
+        """
+        return await self._process_file_async(image_path, custom_prompt, language, "imagen", limiter)
+    
+    async def _process_file_async(self, file_path, custom_prompt, language, file_label, limiter=None):
+        """
+        Extrae el texto de un archivo (imagen o PDF), usando la caché si es posible.
+        
+        Args:
+            file_path (str): Ruta al archivo
+            custom_prompt (str): Prompt personalizado para la extracción
+            language (str): Idioma del texto a extraer
+            file_label (str): Tipo de archivo para los mensajes de error ("PDF", "imagen")
+            limiter (AdaptiveConcurrencyLimiter): Limitador de concurrencia opcional
+            
+        Returns:
+            str: Texto extraído o mensaje de error/cancelación
+        """
+        # Preparar el archivo y consultar la caché antes de consumir cuota de la API.
+        # El hash se calcula en un hilo para solaparlo con las solicitudes en curso
+        try:
+            file_hash = await asyncio.to_thread(self._hash_file, file_path)
+        except OSError as e:
+            print(f"Error procesando {file_path}: {str(e)}")
+            return f"Error procesando {file_label}: {str(e)}"
+        
+        cache_key = self._cache_key(file_hash, custom_prompt, language)
+        if self.cache is not None:
+            cached_text = self.cache.get(cache_key)
+            if cached_text is not None:
+                print(f"Resultado recuperado de la caché: {os.path.basename(file_path)}")
+                return cached_text
+        
+        duplicate_text = await self._wait_for_duplicate(cache_key, file_path)
+        if duplicate_text is not None:
+            return duplicate_text
+        # Sin await entre la comprobación y el registro: ninguna otra tarea puede
+        # reclamar el mismo contenido entre medias
+        future = self._claim(cache_key)
+        
+        extracted_text = None
+        try:
+            result, extracted_text = await self._extract_file_async(
+                file_path, file_hash, cache_key, custom_prompt, language, file_label, limiter
+            )
+            return result
+        finally:
+            self._settle(cache_key, future, extracted_text)
+    
+    async def _extract_file_async(self, file_path, file_hash, cache_key, custom_prompt, language,
+                                  file_label, limiter=None):
+        """
+        Envía un archivo a la API y guarda el resultado en la caché. El contenido debe
+        estar ya reclamado con _claim.
+        
+        Args:
+            file_path (str): Ruta al archivo
+            file_hash (str): Hash SHA-256 del contenido del archivo
+            cache_key (str): Clave de caché del contenido
+            custom_prompt (str): Prompt personalizado para la extracción
+            language (str): Idioma del texto a extraer
+            file_label (str): Tipo de archivo para los mensajes de error ("PDF", "imagen")
+            limiter (AdaptiveConcurrencyLimiter): Limitador de concurrencia opcional
+            
+        Returns:
+            tuple: (texto extraído o mensaje de error/cancelación, texto extraído o None si falló)
+        """
+        # Crear el prompt completo
+        full_prompt = f"{custom_prompt} El texto está en {language}."
+        extracted = []
+        
+        async def request(generate):
+            # Subir el archivo (o reutilizar la subida previa)
+            uploaded = await self._get_upload(file_path, file_hash)
+            extracted_text = await generate([full_prompt, uploaded])
+            if extracted_text is None:
+                return None
+            extracted.append(extracted_text)
+            if self.cache is not None:
+                self.cache.set(cache_key, extracted_text)
+            return extracted_text
+        
+        # El archivo subido se borra en cuanto hay resultado (o se abandona la solicitud)
+        self._retain_upload(file_hash)
+        try:
+            result = await self._call_with_retry(request, file_path, file_label, limiter)
+        finally:
+            await self._release_upload(file_hash)
+        return result, extracted[0] if extracted else None
+    
+    def _claim(self, cache_key):
+        """
+        Registra que un contenido se está procesando para que sus duplicados esperen.
+        
+        Args:
+            cache_key (str): Clave de caché del contenido
+            
+        Returns:
+            asyncio.Future: Futuro que se debe resolver con _settle
+        """
+        future = self.loop.create_future()
+        self.in_flight_results[cache_key] = future
+        return future
+    
+    def _settle(self, cache_key, future, text):
+        """
+        Publica el resultado de un contenido a los duplicados que lo esperan.
+        
+        Args:
+            cache_key (str): Clave de caché del contenido
+            future (asyncio.Future): Futuro devuelto por _claim
+            text (str): Texto extraído, o None si la solicitud no tuvo éxito
+        """
+        if self.in_flight_results.get(cache_key) is future:
+            del self.in_flight_results[cache_key]
+        if not future.done():
+            future.set_result(text)
+    
+    async def _wait_for_duplicate(self, cache_key, file_path):
+        """
+        Si el mismo contenido ya se está procesando, espera su resultado en lugar de
+        enviarlo otra vez. Los errores y cancelaciones no se copian: si el otro archivo
+        falla, este se procesa por su cuenta y obtiene su propio mensaje.
+        
+        Args:
+            cache_key (str): Clave de caché del contenido
+            file_path (str): Ruta al archivo (para los mensajes)
+            
+        Returns:
+            str: Texto extraído del archivo idéntico, o None si hay que procesarlo
+        """
+        while cache_key in self.in_flight_results:
+            text = await asyncio.shield(self.in_flight_results[cache_key])
+            if text is not None:
+                print(f"Resultado reutilizado de un archivo idéntico: {os.path.basename(file_path)}")
+                return text
+        return None
+    
+    async def _wait_for_quota(self):
+        """
+        Espera a que el límite diario permita una nueva solicitud. La espera se hace con
+        asyncio.sleep en el bucle, y el hilo que llamó al método síncrono sigue atendiendo
+        Ctrl-C (ver _run). La pregunta interactiva se hace en un hilo aparte, así que las
+        solicitudes en curso continúan mientras el usuario responde.
+        
+        Returns:
+            bool: True si se puede enviar la solicitud, False si se debe cancelar
+        """
+        if self.quota_lock is None:
+            self.quota_lock = asyncio.Lock()
+        while True:
+            # Solo una tarea a la vez decide qué hacer al alcanzar el límite; las demás
+            # esperan su decisión en lugar de volver a preguntar
+            async with self.quota_lock:
+                wait_seconds = self.rate_limiter.reserve()
+                if wait_seconds == 0:
+                    return True
+                if self.interactive:
+                    should_wait = await self._run_in_daemon_thread(
+                        self.rate_limiter.should_wait, wait_seconds, True
+                    )
+                else:
+                    should_wait = self.rate_limiter.should_wait(wait_seconds)
+            if not should_wait:
+                return False
+            await asyncio.sleep(wait_seconds)
+    
+    async def _run_in_daemon_thread(self, func, *args):
+        """
+        Ejecuta una función bloqueante en un hilo daemon sin detener el bucle. A diferencia
+        de asyncio.to_thread, el hilo no impide salir del programa si se interrumpe con
+        Ctrl-C mientras espera (por ejemplo, en input()).
+        
+        Args:
+            func (callable): Función a ejecutar
+            *args: Argumentos de la función
+            
+        Returns:
+            Resultado de la función
+        """
+        future = self.loop.create_future()
+        
+        def resolve(method, value):
+            if not future.done():
+                method(value)
+        
+        def target():
+            try:
+                result = func(*args)
+            except BaseException as e:
+                outcome = (future.set_exception, e)
+            else:
+                outcome = (future.set_result, result)
+            try:
+                self.loop.call_soon_threadsafe(resolve, *outcome)
+            except RuntimeError:
+                pass  # El bucle ya se cerró
+        
+        threading.Thread(target=target, daemon=True).start()
+        return await future
+    
+    def _retry_delay(self, error):
+        """
+        Obtiene el tiempo de espera recomendado por la API (RetryInfo) en un error de cuota.
+        
+        Args:
+            error (ResourceExhausted): Error devuelto por la API
+            
+        Returns:
+            float: Segundos de espera, o None si la API no indica ninguno
+        """
+        for detail in error.details or []:
+            retry_delay = getattr(detail, "retry_delay", None)
+            if retry_delay is not None:
+                return retry_delay.seconds + retry_delay.nanos / 1e9
+        return None
+    
+    async def _call_with_retry(self, request, file_path, file_label, limiter=None):
+        """
+        Ejecuta una solicitud respetando el rate limiter y reintentando los errores de cuota
+        y los errores temporales de la API.
+        
+        Args:
+            request (callable): Función asíncrona que realiza la solicitud (ver _send)
+            file_path (str): Ruta al archivo procesado (para los mensajes)
+            file_label (str): Tipo de archivo para los mensajes de error ("PDF", "imagen")
+            limiter (AdaptiveConcurrencyLimiter): Limitador de concurrencia opcional
+            
+        Returns:
+            str: Resultado de la solicitud o mensaje de error/cancelación
+        """
         retry_count = 0
         base_wait_time = 2  # Tiempo base de espera en segundos
         
         while retry_count <= self.max_retries:
             try:
                 # Esperar si es necesario para respetar los límites de la API
-                wait_time, should_continue = self.rate_limiter.wait_if_needed(self.interactive)
-                if not should_continue:
-                    return f"Proceso cancelado por el usuario para {image_path}"
+                result = await self._send(request, limiter)
+                if result is None:
+                    if self.rate_limiter.tripped:
+                        return f"{QUOTA_EXHAUSTED_MESSAGE} para {file_path}"
+                    return f"Proceso cancelado por el usuario para {file_path}"
                 
-                # Preparar la imagen
-                image_data = self._encode_file(image_path)
+                return result
+            
+            except google_exceptions.ResourceExhausted as e:
+                # Error de cuota (429): reintentar con espera mientras queden intentos
+                if retry_count >= self.max_retries:
+                    print(f"Error procesando {file_path}: {e.message}")
+                    return f"Error procesando {file_label}: {e.message}"
+                retry_count += 1
                 
-                # Crear el prompt completo
-                full_prompt = f"{custom_prompt} El texto está en {language}."
+                # Usar el tiempo de espera recomendado o, si no lo hay, espera exponencial
+                wait_time = self._retry_delay(e)
+                if not wait_time:
+                    wait_time = base_wait_time * (2 ** retry_count) + random.uniform(0, 1)
                 
-                # Realizar la solicitud a la API
-                response = self.model.generate_content(
-                    contents=[
-                        full_prompt,
-                        image_data
-                    ]
-                )
+                if limiter is not None:
+                    limiter.pause(wait_time)
                 
-                # Extraer el texto de la respuesta
-                extracted_text = response.text
-                return extracted_text
+                print(f"Error de cuota en {file_path}. Reintentando en {wait_time:.1f} segundos (intento {retry_count}/{self.max_retries})...")
+                await asyncio.sleep(wait_time)
             
-            except Exception as e:
-                error_message = str(e)
+            except self.TRANSIENT_ERRORS as e:
+                # Error temporal (5xx o tiempo agotado): reintentar con espera exponencial
+                if retry_count >= self.max_retries:
+                    print(f"Error procesando {file_path}: {e.message}")
+                    return f"Error procesando {file_label}: {e.message}"
+                retry_count += 1
                 
-                # Si es un error de cuota (429), implementar reintento con espera
-                if "429" in error_message and retry_count < self.max_retries:
-                    retry_count += 1
-                    
-                    # Extraer el tiempo de espera recomendado si está disponible
-                    wait_time = None
-                    if "retry_delay" in error_message and "seconds:" in error_message:
-                        try:
-                            wait_time_str = error_message.split("seconds:")[1].split("}")[0].strip()
-                            wait_time = int(wait_time_str)
-                        except:
-                            pass
-                    
-                    # Si no se pudo extraer el tiempo de espera, usar espera exponencial
-                    if not wait_time:
-                        wait_time = base_wait_time * (2 ** retry_count) + random.uniform(0, 1)
-                    
-                    print(f"Error de cuota en {image_path}. Reintentando en {wait_time:.1f} segundos (intento {retry_count}/{self.max_retries})...")
-                    time.sleep(wait_time)
-                else:
-                    # Si es otro tipo de error o se agotaron los reintentos, propagar el error
-                    print(f"Error procesando {image_path}: {error_message}")
-                    return f"Error procesando imagen: {error_message}"
+                wait_time = base_wait_time * (2 ** retry_count) + random.uniform(0, 1)
+                print(f"Error temporal de la API en {file_path}. Reintentando en {wait_time:.1f} segundos (intento {retry_count}/{self.max_retries})...")
+                await asyncio.sleep(wait_time)
+            
+            except Exception as e:
+                # Cualquier otro error (de la API o local) no se reintenta
+                print(f"Error procesando {file_path}: {str(e)}")
+                return f"Error procesando {file_label}: {str(e)}"
         
-        return f"Error: Se agotaron los reintentos para procesar {image_path}"
+        return f"Error: Se agotaron los reintentos para procesar {file_path}"
     
     def process_batch(self, input_path, format_type="markdown", recursive=False, 
-                     preprocess=False, custom_prompt="", language="Spanish"):
+                     preprocess=False, custom_prompt="", language="Spanish", images_per_call=1):
         """
         Procesa un lote de imágenes en una carpeta.
         
@@ -288,42 +1046,214 @@ class GeminiOCRProcessor:
             preprocess (bool): Si se debe preprocesar las imágenes
             custom_prompt (str): Prompt personalizado para la extracción
             language (str): Idioma del texto a extraer
+            images_per_call (int): Número de imágenes enviadas en cada solicitud a la API.
+                                   Con valores mayores que 1 cada solicitud cubre varias
+                                   imágenes y consume una sola unidad del límite diario.
             
         Returns:
             dict: Resultados del procesamiento por archivo
         """
-        # Encontrar todas las imágenes
-        pattern = os.path.join(input_path, "**/*.png" if recursive else "*.png")
-        image_files = glob.glob(pattern, recursive=recursive)
-        
-        results = {"results": {}}
-        
-        # Procesar imágenes en paralelo
-        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
-            # Crear una lista de futuros
-            future_to_file = {
-                executor.submit(
-                    self.process_image, 
-                    image_file, 
-                    custom_prompt,
-                    language
-                ): image_file for image_file in image_files
-            }
-            
-            # Procesar resultados a medida que se completan
-            for future in tqdm(future_to_file, desc="Procesando imágenes"):
-                image_file = future_to_file[future]
+        # Encontrar las imágenes que aún no tienen un resultado guardado
+        image_files, skipped = _find_pending_images(input_path, recursive)
+        image_files.sort(key=_natural_sort_key)
+        if skipped:
+            print(f"Saltando {skipped} imágenes que ya tienen un archivo .md o .txt.")
+        
+        return self._run(self._process_batch_async(image_files, custom_prompt, language, images_per_call))
+    
+    async def _process_batch_async(self, image_files, custom_prompt, language, images_per_call=1):
+        """
+        Procesa las imágenes de forma concurrente, ajustando las solicitudes en vuelo
+        con un controlador AIMD según la latencia y los errores de la API.
+        
+        Args:
+            image_files (list): Rutas de las imágenes a procesar
+            custom_prompt (str): Prompt personalizado para la extracción
+            language (str): Idioma del texto a extraer
+            images_per_call (int): Número de imágenes enviadas en cada solicitud
+            
+        Returns:
+            dict: Resultados del procesamiento por archivo, en el orden de image_files
+        """
+        completed = {}
+        limiter = AdaptiveConcurrencyLimiter(
+            initial=self.max_workers,
+            max_concurrency=self.max_concurrency
+        )
+        
+        async def bound(group):
+            try:
+                return await self._process_image_group_async(group, custom_prompt, language, limiter)
+            except Exception as e:
+                print(f"Error procesando {', '.join(group)}: {str(e)}")
+                return {image_file: f"Error: {str(e)}" for image_file in group}
+        
+        images_per_call = max(1, images_per_call)
+        groups = [image_files[i:i + images_per_call] for i in range(0, len(image_files), images_per_call)]
+        tasks = [asyncio.create_task(bound(group)) for group in groups]
+        interrupted = False
+        
+        # Procesar resultados a medida que se completan
+        for next_done in tqdm.as_completed(tasks, desc="Procesando imágenes"):
+            group_results = await next_done
+            completed.update(group_results)
+            
+            # Si el usuario canceló o se agotó la cuota no hace falta cancelar las tareas:
+            # las solicitudes en curso terminan y el resto se rechaza al instante
+            if not interrupted and any(
+                result.startswith("Proceso cancelado por el usuario") for result in group_results.values()
+            ):
+                print("\nProcesamiento interrumpido por el usuario; se terminan las imágenes en curso.")
+                interrupted = True
+        
+        # Los resultados llegan en orden de finalización; devolverlos en el orden de entrada.
+        # Las imágenes idénticas (páginas en blanco, portadas repetidas...) se envían una sola
+        # vez: ver _wait_for_duplicate
+        results = {image_file: completed[image_file] for image_file in image_files if image_file in completed}
+        return {"results": results}
+    
+    async def _process_image_group_async(self, image_files, custom_prompt, language, limiter=None):
+        """
+        Extrae el texto de varias imágenes con una única solicitud a la API.
+        Las imágenes ya presentes en la caché no se envían, y las idénticas a otra en curso
+        no se envían dos veces. Si la respuesta no se puede dividir en una sección por
+        imagen, cada imagen se procesa por separado.
+        
+        Args:
+            image_files (list): Rutas de las imágenes
+            custom_prompt (str): Prompt personalizado para la extracción
+            language (str): Idioma del texto a extraer
+            limiter (AdaptiveConcurrencyLimiter): Limitador de concurrencia opcional
+            
+        Returns:
+            dict: Texto extraído (o mensaje de error/cancelación) por imagen
+        """
+        if len(image_files) == 1:
+            image_file = image_files[0]
+            return {image_file: await self._process_image_async(image_file, custom_prompt, language, limiter)}
+        
+        results = {}
+        pending = []
+        duplicates = []
+        texts = {}
+        try:
+            for image_file in image_files:
                 try:
-                    result = future.result()
-                    results["results"][image_file] = result
-                    
-                    # Verificar si el proceso fue cancelado por el usuario
-                    if result.startswith("Proceso cancelado por el usuario"):
-                        print("\nProcesamiento interrumpido por el usuario.")
-                        break
-                        
-                except Exception as e:
+                    file_hash = await asyncio.to_thread(self._hash_file, image_file)
+                except OSError as e:
                     print(f"Error procesando {image_file}: {str(e)}")
-                    results["results"][image_file] = f"Error: {str(e)}"
+                    results[image_file] = f"Error procesando imagen: {str(e)}"
+                    continue
+                
+                cache_key = self._cache_key(file_hash, custom_prompt, language)
+                cached_text = self.cache.get(cache_key) if self.cache is not None else None
+                if cached_text is not None:
+                    print(f"Resultado recuperado de la caché: {os.path.basename(image_file)}")
+                    results[image_file] = cached_text
+                elif cache_key in self.in_flight_results:
+                    # Idéntica a otra imagen en curso (de otro grupo o de este): se resuelve al final
+                    duplicates.append((image_file, cache_key, self.in_flight_results[cache_key]))
+                else:
+                    # Se reclama en el mismo paso que la comprobación, sin await entre medias,
+                    # para que ningún otro grupo envíe el mismo contenido
+                    pending.append((image_file, file_hash, cache_key, self._claim(cache_key)))
+            
+            if len(pending) == 1:
+                image_file, file_hash, cache_key, _ = pending[0]
+                results[image_file], text = await self._extract_file_async(
+                    image_file, file_hash, cache_key, custom_prompt, language, "imagen", limiter
+                )
+                if text is not None:
+                    texts[cache_key] = text
+            elif pending:
+                group_results, texts = await self._process_pending_group_async(
+                    [(image_file, file_hash, cache_key) for image_file, file_hash, cache_key, _ in pending],
+                    custom_prompt, language, limiter
+                )
+                results.update(group_results)
+        finally:
+            for _, _, cache_key, future in pending:
+                self._settle(cache_key, future, texts.get(cache_key))
         
+        # Los duplicados reutilizan el texto de su copia si se extrajo con éxito; si no, se
+        # procesan por su cuenta (esperando a la copia en curso si la hay), de modo que los
+        # errores y cancelaciones siempre nombran su propio archivo
+        for image_file, cache_key, future in duplicates:
+            text = await asyncio.shield(future)
+            if text is not None:
+                print(f"Resultado reutilizado de un archivo idéntico: {os.path.basename(image_file)}")
+                results[image_file] = text
+            else:
+                results[image_file] = await self._process_image_async(image_file, custom_prompt, language, limiter)
         return results
+    
+    async def _process_pending_group_async(self, pending, custom_prompt, language, limiter=None):
+        """
+        Envía varias imágenes que no están en la caché en una única solicitud a la API.
+        Las imágenes deben estar ya reclamadas con _claim.
+        
+        Args:
+            pending (list): Tuplas (ruta, hash, clave de caché) de las imágenes a enviar
+            custom_prompt (str): Prompt personalizado para la extracción
+            language (str): Idioma del texto a extraer
+            limiter (AdaptiveConcurrencyLimiter): Limitador de concurrencia opcional
+            
+        Returns:
+            tuple: (texto o mensaje de error/cancelación por imagen,
+                    texto extraído con éxito por clave de caché)
+        """
+        results = {}
+        texts = {}
+        full_prompt = (
+            f"{custom_prompt} El texto está en {language}. "
+            f"Recibirás {len(pending)} imágenes. Devuelve el resultado de cada una en el mismo orden, "
+            f"empezando cada resultado con una línea '## PAGE n', donde n es la posición de la imagen (desde 1)."
+        )
+        pages = {}
+        responded = []
+        
+        async def request(generate):
+            # Las subidas se hacen en paralelo para no retener el hueco de concurrencia
+            uploaded = await asyncio.gather(*(
+                self._get_upload(image_file, file_hash)
+                for image_file, file_hash, _ in pending
+            ))
+            extracted_text = await generate([full_prompt, *uploaded])
+            if extracted_text is None:
+                return None
+            responded.append(True)
+            sections = _split_pages(extracted_text, len(pending))
+            if sections is not None:
+                for (image_file, _, cache_key), section in zip(pending, sections):
+                    pages[image_file] = section
+                    if self.cache is not None:
+                        self.cache.set(cache_key, section)
+            return extracted_text
+        
+        label = ", ".join(image_file for image_file, _, _ in pending)
+        # Las subidas se conservan hasta terminar también el posible reintento por separado
+        for _, file_hash, _ in pending:
+            self._retain_upload(file_hash)
+        try:
+            result = await self._call_with_retry(request, label, "imágenes", limiter)
+            
+            if pages:
+                results.update(pages)
+                for image_file, _, cache_key in pending:
+                    texts[cache_key] = pages[image_file]
+            elif responded:
+                print(f"La respuesta no contiene una sección por imagen; procesando por separado: {label}")
+                for image_file, file_hash, cache_key in pending:
+                    results[image_file], text = await self._extract_file_async(
+                        image_file, file_hash, cache_key, custom_prompt, language, "imagen", limiter
+                    )
+                    if text is not None:
+                        texts[cache_key] = text
+            else:
+                # Error o cancelación: se asigna el mismo mensaje a todas las imágenes del grupo
+                for image_file, _, _ in pending:
+                    results[image_file] = result
+        finally:
+            for _, file_hash, _ in pending:
+                await self._release_upload(file_hash)
+        return results, texts
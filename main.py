@@ -3,7 +3,7 @@ from pathlib import Path
 import time
 import os
 from dotenv import load_dotenv
-from gemini_ocr import GeminiOCRProcessor
+from gemini_ocr import GeminiOCRProcessor, QUOTA_EXHAUSTED_MESSAGE
 
 # Cargar variables de entorno desde .env
 load_dotenv()
@@ -11,7 +11,7 @@ load_dotenv()
 # Configuración de la API de Gemini
 API_KEY = os.getenv("GOOGLE_API_KEY")
 MAX_RETRIES = 5  # Número máximo de reintentos para errores de cuota
-MAX_WORKERS = 2  # Reducido para evitar sobrecargar la API
+MAX_WORKERS = 2  # PDFs procesados a la vez al inicio; se ajusta según la respuesta de la API
 MAX_REQUESTS_PER_DAY = 25  # Límite de solicitudes por día según la documentación de Google
 INTERACTIVE = True  # Permite al usuario decidir si continuar o no cuando se alcanza el límite diario
 PROMPT = (
@@ -22,19 +22,14 @@ PROMPT = (
     "No incluyas ningún contenido adicional ni información sobre herramientas externas o detalles que no estén presentes en el documento."
 )
 
-def process_pdf(pdf_path):
+def create_ocr_processor():
     """
-    Procesa un archivo PDF completo directamente con la API de Google Gemini.
+    Crea el procesador OCR compartido por todos los PDFs de la ejecución, de modo que
+    el límite diario de solicitudes y la conexión con la API se reutilizan entre archivos.
     
-    Args:
-        pdf_path (Path): Ruta al archivo PDF a procesar
-        
     Returns:
-        str: Contenido extraído en formato Markdown
+        GeminiOCRProcessor: Procesador OCR configurado
     """
-    print(f"Procesando PDF: {pdf_path.name}")
-    
-    # Inicializar GeminiOCRProcessor
     ocr = GeminiOCRProcessor(
         api_key=API_KEY, 
         max_workers=MAX_WORKERS, 
@@ -48,51 +43,83 @@ def process_pdf(pdf_path):
     if INTERACTIVE:
         print("Modo interactivo activado: se te preguntará si deseas continuar cuando se alcance el límite diario.")
     
-    # Procesar el PDF completo directamente
-    result = ocr.process_pdf_direct(
-        pdf_path=str(pdf_path),
-        custom_prompt=PROMPT,
-        language="Spanish"
-    )
+    return ocr
+
+def process_pdfs(pdf_paths, ocr):
+    """
+    Procesa varios PDFs de forma concurrente con la API de Google Gemini y guarda
+    cada resultado en formato Markdown en cuanto está disponible.
     
-    # Verificar si el proceso fue cancelado por el usuario
-    if result.startswith("Proceso cancelado por el usuario"):
-        print(f"Procesamiento cancelado por el usuario.")
-        raise Exception("Procesamiento cancelado por el usuario.")
+    Args:
+        pdf_paths (list): Rutas (Path) de los archivos PDF a procesar
+        ocr (GeminiOCRProcessor): Procesador OCR compartido
+        
+    Returns:
+        str: Motivo por el que se detuvo el procesamiento, o None si terminó normalmente
+    """
+    stop_reason = None
+    
+    def save_result(pdf_path, result):
+        nonlocal stop_reason
+        pdf_path = Path(pdf_path)
+        
+        # Verificar si el proceso fue cancelado por el usuario
+        # (los PDFs en curso se siguen guardando; el resto queda pendiente)
+        if result.startswith("Proceso cancelado por el usuario"):
+            if stop_reason is None:
+                print(f"Procesamiento cancelado por el usuario.")
+            stop_reason = "Finalizando procesamiento de PDFs por solicitud del usuario."
+            return
+        
+        # Verificar si se agotó la cuota diaria (el PDF queda pendiente para otra ejecución)
+        if result.startswith(QUOTA_EXHAUSTED_MESSAGE):
+            print(f"Sin cuota disponible para {pdf_path.name}.")
+            stop_reason = "Finalizando procesamiento de PDFs: vuelve a ejecutarlo cuando haya cuota disponible."
+            return
         
-    # Verificar si hay errores en el resultado
-    if result.startswith("Error:"):
-        print(f"Advertencia: {result}")
+        # Verificar si hay errores en el resultado
+        if result.startswith("Error:"):
+            print(f"Advertencia: {result}")
+        
+        # Guardar el contenido
+        output_path = pdf_path.with_suffix('.md')
+        try:
+            with open(output_path, 'w', encoding='utf-8') as f:
+                f.write(result)
+            print(f"Guardado: {output_path}")
+        except OSError as e:
+            print(f"Error guardando {output_path.name}: {str(e)}")
     
-    return result
+    ocr.process_pdfs_direct(
+        pdf_paths=[str(pdf_path) for pdf_path in pdf_paths],
+        custom_prompt=PROMPT,
+        language="Spanish",
+        on_result=save_result
+    )
+    return stop_reason
 
 def main(pdf_folder):
     pdf_dir = Path(pdf_folder)
+    pending = []
     for pdf_path in pdf_dir.glob('*.pdf'):
-        print(f"Procesando: {pdf_path.name}")
         output_path = pdf_path.with_suffix('.md')
         if output_path.exists():
             print(f"El archivo {output_path.name} ya existe. Saltando...")
             continue
-
-        try:
-            md_content = process_pdf(pdf_path)
-            
-            # Guardar el contenido
-            with open(output_path, 'w', encoding='utf-8') as f:
-                f.write(md_content)
-            
-            print(f"Guardado: {output_path}")
-            
-        except KeyboardInterrupt:
-            print("Interrupción por teclado. Finalizando procesamiento de PDFs.")
-            sys.exit(0)
-        except Exception as e:
-            print(f"Error procesando {pdf_path.name}: {str(e)}")
-            if "Procesamiento cancelado por el usuario" in str(e):
-                print("Finalizando procesamiento de PDFs por solicitud del usuario.")
-                sys.exit(0)
-            print("Continuando con el siguiente archivo...")
+        pending.append(pdf_path)
+    
+    if not pending:
+        print("No hay PDFs pendientes de procesar.")
+        return
+    
+    ocr = create_ocr_processor()
+    print(f"Procesando {len(pending)} PDFs de forma concurrente (inicialmente {MAX_WORKERS} a la vez).")
+    try:
+        stop_reason = process_pdfs(pending, ocr)
+    finally:
+        ocr.close()
+    if stop_reason:
+        print(stop_reason)
 
 if __name__ == "__main__":
     if len(sys.argv) != 2: